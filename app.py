@@ -1,17 +1,26 @@
 import os
 import math
-import json
-import base64
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
-import requests
 import streamlit as st
+import numpy as np
+import orjson
+import requests
 from dotenv import load_dotenv
-from streamlit_folium import st_folium
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import folium
 
 # utils.py must provide at least these:
 from utils import (
+    JSON_HEADERS,
+    RETRY_STATUSES,
+    SESSION,
+    SESSION_NO_RETRY,
+    disk_cached_get_json,
+    fmt_date,
+    haversine_vector,
     nominatim_geocode,
     google_streetview_embed_url,
 )
@@ -35,28 +44,21 @@ GOOGLE_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 # Mapillary helpers (from your first app)
 # ======================================
 
-MAP_FIELDS = "id,computed_geometry,thumb_1024_url,thumb_2048_url,captured_at,is_pano"
-
-
-def _deg_for_meters(lat_deg: float, meters: float):
-    """Approximate latitude/longitude offsets in degrees for a distance in meters."""
-    dlat = meters / 111_320.0
-    dlon = dlat * math.cos(math.radians(lat_deg))
-    return dlat, dlon
+# Mapillary searches in flight per lookup (closeto + the closest radii)
+MAPILLARY_WORKERS = 3
 
+MAP_FIELDS = "id,computed_geometry,thumb_1024_url,thumb_2048_url,captured_at,is_pano"
 
-def _haversine_m(lat1, lon1, lat2, lon2):
-    """Distance in meters between two lat/lon points using the Haversine formula."""
-    from math import radians, sin, cos, asin, sqrt
 
-    R = 6371000.0
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = (
-        sin(dlat / 2) ** 2
-        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+def mapillary_radii(radius: int):
+    """
+    Bbox search radii (meters): the slider radius, then wider fallbacks.
+    Sorted and de-duplicated (e.g. 300 -> 600 would repeat the fixed 600),
+    since each radius costs one request.
+    """
+    return tuple(
+        sorted({radius, max(radius * 2, 300), 600, 1200, 3000, 6000, 10000})
     )
-    return 2 * R * asin(sqrt(a))
 
 
 def mapillary_find_best(
@@ -80,125 +82,136 @@ def mapillary_find_best(
 
     if radii_m is None:
         radii_m = (150, 300, 600, 1200, 3000, 6000, 10000)
+    radii_m = sorted(set(radii_m))
 
     base = "https://graph.mapillary.com/images"
 
-    def rank_items(items):
+    def lon_lat(it):
+        geom = (it.get("computed_geometry") or {}).get("coordinates")
+        if isinstance(geom, (list, tuple)) and len(geom) == 2:
+            return geom
+        return (np.nan, np.nan)
+
+    def pick(items):
         """
-        Rank images:
-        - panoramic images first
-        - then by distance (closest first)
+        Return (thumb_url, item) for the best image of a response:
+        - the closest panoramic image if require_pano and there is one
+        - otherwise the closest image
+        A single O(n) argmin, no full ranking sort.
         """
-        ranked = []
-        for it in items:
-            geom = (it.get("computed_geometry") or {}).get("coordinates")
-            if isinstance(geom, (list, tuple)) and len(geom) == 2:
-                dist = _haversine_m(lat, lon, geom[1], geom[0])
-            else:
-                dist = float("inf")
-            ranked.append((bool(it.get("is_pano")), dist, it))
-        ranked.sort(key=lambda x: (-int(x[0]), x[1]))  # pano first, then distance
-        return ranked
-
-    # 1) First try with 'closeto'
-    try:
-        r = requests.get(
+        coords = np.array([lon_lat(it) for it in items], dtype=np.float64)
+        dist = haversine_vector(lat, lon, coords[:, 1], coords[:, 0])
+        dist = np.where(np.isnan(dist), np.inf, dist)
+        candidates = np.arange(len(items))
+        if require_pano:
+            panos = np.flatnonzero([bool(it.get("is_pano")) for it in items])
+            if panos.size:
+                candidates = panos
+        it = items[int(candidates[np.argmin(dist[candidates])])]
+        return it.get("thumb_1024_url") or it.get("thumb_2048_url"), it
+
+    def fetch(params, timeout, session=SESSION):
+        r = session.get(
             base,
-            params={
-                "access_token": token,
-                "fields": MAP_FIELDS,
-                "limit": 20,
-                "closeto": f"{lat},{lon}",
-            },
-            timeout=20,
+            params={"access_token": token, "fields": MAP_FIELDS, **params},
+            headers=JSON_HEADERS,
+            timeout=timeout,
         )
         r.raise_for_status()
-        items = r.json().get("data", [])
-        if items:
-            ranked = rank_items(items)
-            if require_pano:
-                panos = [t for t in ranked if t[0]]
-                if panos:
-                    it = panos[0][2]
-                    return (
-                        it.get("thumb_1024_url") or it.get("thumb_2048_url"),
-                        it,
-                    )
-            it = ranked[0][2]
-            return it.get("thumb_1024_url") or it.get("thumb_2048_url"), it
-    except Exception:
-        pass
+        body = orjson.loads(r.content)
+        if not isinstance(body, dict):
+            raise ValueError(f"unexpected Mapillary response: {type(body).__name__}")
+        return body.get("data") or []
 
-    # 2) Fallback: use bbox searches with multiple radii
-    for radius in radii_m:
-        dlat, dlon = _deg_for_meters(lat, radius)
-        bbox = f"{lon - dlon},{lat - dlat},{lon + dlon},{lat + dlat}"
+    def closeto():
+        """
+        Nearest-images search. Sent without retries so the short timeout is a
+        hard cap; transient failures and malformed bodies (e.g. a proxy's
+        HTML error page) fall through to the bbox results, other HTTP errors
+        (e.g. a revoked token) are raised to the caller.
+        """
         try:
-            r = requests.get(
-                base,
-                params={
-                    "access_token": token,
-                    "fields": MAP_FIELDS,
-                    "limit": 50,
-                    "bbox": bbox,
-                },
-                timeout=20,
+            return fetch(
+                {"limit": 20, "closeto": f"{lat},{lon}"},
+                timeout=(3, 5),
+                session=SESSION_NO_RETRY,
             )
-            r.raise_for_status()
-            items = r.json().get("data", [])
-            if not items:
-                continue
-            ranked = rank_items(items)
-            if require_pano:
-                panos = [t for t in ranked if t[0]]
-                if panos:
-                    it = panos[0][2]
-                    return (
-                        it.get("thumb_1024_url") or it.get("thumb_2048_url"),
-                        it,
-                    )
-            it = ranked[0][2]
-            return it.get("thumb_1024_url") or it.get("thumb_2048_url"), it
+        except (
+            requests.exceptions.Timeout,
+            requests.exceptions.ConnectionError,
+            ValueError,
+        ):
+            return []
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code in RETRY_STATUSES:
+                return []
+            raise
+
+    def bbox_search(bbox):
+        """Bbox search around the point, returning its items ([] on any error)."""
+        try:
+            return fetch({"limit": 50, "bbox": bbox}, timeout=20)
         except Exception:
-            continue
+            return []
+
+    # 1) 'closeto' search, then 2) bbox searches with growing radii.
+    # They run as a sliding window of MAPILLARY_WORKERS requests: results
+    # are consumed in priority order so the smallest successful search wins,
+    # as before, and the next radius is only submitted once an earlier one
+    # came back empty, so wider searches past a hit are never sent.
+    # Longitude degrees shrink with cos(lat): computed once for all radii
+    deg_per_m = 1.0 / 111_320.0
+    cos_lat = max(0.1, math.cos(math.radians(lat)))
+    bboxes = []
+    for radius in radii_m:
+        dlat = radius * deg_per_m
+        dlon = dlat / cos_lat
+        bboxes.append(f"{lon - dlon},{lat - dlat},{lon + dlon},{lat + dlat}")
+
+    searches = iter([(closeto,)] + [(bbox_search, bbox) for bbox in bboxes])
+    ex = ThreadPoolExecutor(max_workers=MAPILLARY_WORKERS)
+    try:
+        window = deque(
+            ex.submit(*search) for search in islice(searches, MAPILLARY_WORKERS)
+        )
+        while window:
+            items = window.popleft().result()
+            if items:
+                return pick(items)
+            search = next(searches, None)
+            if search:
+                window.append(ex.submit(*search))
+    finally:
+        # In-flight searches finish unread
+        ex.shutdown(wait=False)
 
     return None, None
 
 
-def _fmt_date(value) -> str:
-    """Convert Mapillary date or timestamp to an ISO date string when possible."""
-    if not value:
-        return ""
-    if isinstance(value, (int, float)):
-        try:
-            # If > 1e12 it is likely in milliseconds
-            if value > 1e12:
-                value /= 1000.0
-            return datetime.utcfromtimestamp(value).date().isoformat()
-        except Exception:
-            return ""
-    if isinstance(value, str):
-        try:
-            return (
-                datetime.fromisoformat(value.replace("Z", "+00:00"))
-                .date()
-                .isoformat()
-            )
-        except Exception:
-            return value[:10]
-    return str(value)
+@st.cache_data(ttl=1800, max_entries=256, show_spinner=False)
+def _mapillary_find_best_cached(lat_q, lon_q, token, radii_m, require_pano):
+    return mapillary_find_best(lat_q, lon_q, token, radii_m, require_pano)
 
 
-def pannellum_html_from_image_bytes(img_bytes: bytes, height_px: int = 480) -> str:
+def cached_mapillary_find_best(lat, lon, token, radii_m, require_pano=False):
     """
-    Build an HTML block that uses Pannellum to render a 360° panorama from JPEG bytes.
+    mapillary_find_best with results cached for 30 min, keyed on the point
+    quantised to ~1 m, so repeat addresses and the no-pano retry are free.
     """
-    data_uri = "data:image/jpeg;base64," + base64.b64encode(img_bytes).decode(
-        "ascii"
+    return _mapillary_find_best_cached(
+        round(lat, 5), round(lon, 5), token, tuple(radii_m), require_pano
     )
+
+
+def pannellum_html_from_url(pano_url: str, height_px: int = 480) -> str:
+    """
+    Build an HTML block that uses Pannellum to render a 360° panorama.
+    The browser loads the viewer and the JPEG straight from their URLs
+    and caches them, so only a small HTML block goes through Streamlit.
+    """
     cfg = {
         "type": "equirectangular",
-        "panorama": data_uri,
+        "panorama": pano_url,
         "autoLoad": True,
         "autoRotate": -2,
         "showZoomCtrl": True,
@@ -210,7 +223,7 @@ def pannellum_html_from_image_bytes(img_bytes: bytes, height_px: int = 480) -> s
     <script src="https://cdn.jsdelivr.net/npm/pannellum/build/pannellum.js"></script>
     <script>
       (function(){{
-        var cfg = {json.dumps(cfg)};
+        var cfg = {orjson.dumps(cfg).decode()};
         function init(){{ window.pannellum && pannellum.viewer("pano", cfg); }}
         if (document.readyState === "complete") init(); else window.addEventListener("load", init);
       }})();
@@ -218,6 +231,17 @@ def pannellum_html_from_image_bytes(img_bytes: bytes, height_px: int = 480) -> s
     """
 
 
+@st.cache_data(ttl=86400, max_entries=512, show_spinner=False)
+def fetch_bytes(url: str) -> bytes:
+    """
+    Download an image by URL, cached so reruns don't refetch it.
+    Mapillary thumbnail URLs are content-addressed, hence the long TTL.
+    """
+    r = SESSION.get(url, timeout=30)
+    r.raise_for_status()
+    return r.content
+
+
 # ======================================
 # Geocoding + WFS helpers (cadastre & PLU)
 # ======================================
@@ -231,11 +255,79 @@ def cached_geocode(addr: str):
     return nominatim_geocode(addr)
 
 
-@st.cache_data(ttl=1800)
-def get_cadastre_parcel_from_wfs(lat, lon, bbox_deg=0.001, max_features=10):
+WFS_URL = "https://data.geopf.fr/wfs/ows"
+WFS_PARCEL_LAYER = "CADASTRALPARCELS.PARCELLAIRE_EXPRESS:parcelle"
+WFS_PLU_LAYER = "wfs_du:zone_urba"
+
+# On-disk freshness of WFS responses: parcels and PLU zones change rarely
+# (PLU zones yearly, parcels monthly; one response holds both)
+WFS_MAX_AGE = 7 * 24 * 3600
+
+# Server-side projection: only the attributes the app reads (+ geometry)
+WFS_PARCEL_PROPERTIES = "idu,section,numero,nom_com,contenance,geom"
+WFS_PLU_PROPERTIES = (
+    "libelle,libelong,typezone,nomfic,datvalid,gpu_doc_id,gpu_timestamp,idurba,"
+    "the_geom"
+)
+
+# Parcel attributes (lower-cased) that may hold the area in m²
+AREA_KEYS = frozenset({"contenance", "surface", "surface_m2", "superficie"})
+
+
+def _ring_area_m2(ring) -> float:
+    """
+    Area in m² of a GeoJSON [lon, lat] ring, using the shoelace formula in a
+    local equirectangular projection (accurate at parcel scale).
+    """
+    arr = np.asarray(ring, dtype=np.float64)[:, :2]
+    lon0, lat0 = arr[0]
+    x = (arr[:, 0] - lon0) * 111_320.0 * math.cos(math.radians(lat0))
+    y = (arr[:, 1] - lat0) * 110_540.0
+    return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def _simplify_ring(ring, tolerance: float = 1e-5):
+    """
+    Douglas-Peucker simplification of a closed GeoJSON [lon, lat] ring.
+
+    `tolerance` is in degrees (1e-5 ≈ 1 m): vertices closer than that to the
+    simplified outline are invisible at zoom 18 and only bloat the map HTML.
+    Returns an (n, 2) array; the original ring if it would degenerate.
     """
-    Query IGN WFS (Parcellaire Express) around a point and return
-    the *closest* parcel as a small dictionary:
+    pts = np.asarray(ring, dtype=np.float64)[:, :2]
+    n = len(pts)
+    if n <= 4:
+        return pts
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        seg = pts[j] - pts[i]
+        rel = pts[i + 1 : j] - pts[i]
+        seg_len = math.hypot(seg[0], seg[1])
+        if seg_len == 0:
+            # Closed ring: first and last vertices coincide
+            d = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            d = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / seg_len
+        k = int(np.argmax(d))
+        if d[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+
+    return pts[keep] if keep.sum() >= 4 else pts
+
+
+def parcel_from_features(features, lat, lon):
+    """
+    Pick the *closest* parcel among Parcellaire Express WFS features
+    and return it as a small dictionary:
 
     {
         "coords": [[lat, lon], ...],   # polygon for Folium
@@ -245,40 +337,12 @@ def get_cadastre_parcel_from_wfs(lat, lon, bbox_deg=0.001, max_features=10):
 
     Returns None if nothing is found.
     """
-    wfs_url = "https://data.geopf.fr/wfs/ows"
-
-    min_lon = lon - bbox_deg
-    min_lat = lat - bbox_deg
-    max_lon = lon + bbox_deg
-    max_lat = lat + bbox_deg
-
-    params = {
-        "SERVICE": "WFS",
-        "VERSION": "2.0.0",
-        "REQUEST": "GetFeature",
-        "TYPENAMES": "CADASTRALPARCELS.PARCELLAIRE_EXPRESS:parcelle",
-        "SRSNAME": "EPSG:4326",
-        "BBOX": f"{min_lon},{min_lat},{max_lon},{max_lat},EPSG:4326",
-        "OUTPUTFORMAT": "application/json",
-        "COUNT": str(max_features),
-    }
-
-    try:
-        r = requests.get(wfs_url, params=params, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-    except Exception as e:
-        print("IGN WFS error:", e)
-        return None
-
-    features = data.get("features", [])
     if not features:
         return None
 
-    best_coords = None
-    best_d2 = None
-    best_props = None
-
+    # Outer ring of every (multi)polygon feature
+    rings = []
+    ring_props = []
     for feat in features:
         geom = feat.get("geometry")
         if not geom:
@@ -300,35 +364,32 @@ def get_cadastre_parcel_from_wfs(lat, lon, bbox_deg=0.001, max_features=10):
         if not ring:
             continue
 
-        # Compute centroid
-        sum_lon = sum(pt[0] for pt in ring)
-        sum_lat = sum(pt[1] for pt in ring)
-        n = len(ring)
-        if n == 0:
-            continue
-
-        centroid_lon = sum_lon / n
-        centroid_lat = sum_lat / n
+        rings.append(ring)
+        ring_props.append(feat.get("properties", {}))
 
-        dx = centroid_lon - lon
-        dy = centroid_lat - lat
-        d2 = dx * dx + dy * dy
+    if not rings:
+        return None
 
-        if best_d2 is None or d2 < best_d2:
-            best_d2 = d2
-            best_coords = [[pt[1], pt[0]] for pt in ring]
-            best_props = feat.get("properties", {})
+    # Centroids of all rings in one vectorised pass, then the closest one
+    ring_lens = np.array([len(ring) for ring in rings])
+    pts = np.concatenate(
+        [np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings]
+    )
+    offsets = np.concatenate(([0], np.cumsum(ring_lens)[:-1]))
+    centroid_lon = np.add.reduceat(pts[:, 0], offsets) / ring_lens
+    centroid_lat = np.add.reduceat(pts[:, 1], offsets) / ring_lens
+    d2 = (centroid_lon - lon) ** 2 + (centroid_lat - lat) ** 2
+    best = int(np.argmin(d2))
 
-    if not best_coords:
-        return None
+    # Simplified outline, swapped to [lat, lon] for Folium
+    best_coords = _simplify_ring(rings[best])[:, ::-1].tolist()
+    best_props = ring_props[best]
 
     # Try to extract surface/area from attributes
     area_m2 = None
     if best_props:
-        for key in best_props.keys():
-            lk = key.lower()
-            if "contenance" in lk or "surface" in lk:
-                val = best_props.get(key)
+        for key, val in best_props.items():
+            if key.lower() in AREA_KEYS:
                 try:
                     area_m2 = float(str(val).replace(",", "."))
                 except Exception:
@@ -336,6 +397,10 @@ def get_cadastre_parcel_from_wfs(lat, lon, bbox_deg=0.001, max_features=10):
                 if area_m2 is not None:
                     break
 
+    # No usable attribute: compute it from the polygon itself
+    if area_m2 is None:
+        area_m2 = float(_ring_area_m2(rings[best]))
+
     return {
         "coords": best_coords,
         "area_m2": area_m2,
@@ -364,10 +429,22 @@ def format_plu_info(props: dict) -> dict:
     # Remove empty/null ones
     return {k: v for k, v in readable.items() if v not in (None, "", "NULL")}
 
-@st.cache_data(ttl=600)
-def get_plu_zone_from_wfs(lat, lon, bbox_deg=0.002, max_features=10):
+# GPU attribute names (lower-cased) holding the zone code / label, by priority
+_ZONE_CODE_KEYS = ("libelle", "zone", "code_zone", "codezone", "typezone")
+_ZONE_LABEL_KEYS = (
+    "libelong",
+    "libelle_long",
+    "libellelong",
+    "libelle",
+    "lib_zone",
+    "libelle_zone",
+    "nom_zone",
+)
+
+
+def plu_zone_from_features(features):
     """
-    Simple PLU zoning lookup using GPU WFS (zone_urba layer).
+    Simple PLU zoning from GPU WFS features (zone_urba layer).
 
     Returns:
         {
@@ -376,69 +453,27 @@ def get_plu_zone_from_wfs(lat, lon, bbox_deg=0.002, max_features=10):
             "raw_properties": dict
         }
     """
-    wfs_url = "https://data.geopf.fr/wfs/ows"
-
-    min_lon = lon - bbox_deg
-    min_lat = lat - bbox_deg
-    max_lon = lon + bbox_deg
-    max_lat = lat + bbox_deg
-
-    params = {
-        "SERVICE": "WFS",
-        "VERSION": "2.0.0",
-        "REQUEST": "GetFeature",
-        "TYPENAMES": "wfs_du:zone_urba",
-        "SRSNAME": "EPSG:4326",
-        "BBOX": f"{min_lon},{min_lat},{max_lon},{max_lat},EPSG:4326",
-        "OUTPUTFORMAT": "application/json",
-        "COUNT": str(max_features),
-    }
-
-    try:
-        r = requests.get(wfs_url, params=params, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-    except Exception as e:
-        print("IGN WFS PLU error:", e)
-        return None
-
-    features = data.get("features", [])
     if not features:
         return None
 
     feat = features[0]
     props = feat.get("properties", {})
 
-    zone_code = (
-        props.get("libelle")
-        or props.get("LIBELLE")
-        or props.get("ZONE")
-        or props.get("zone")
-        or props.get("CODE_ZONE")
-        or props.get("code_zone")
-        or props.get("CODEZONE")
-        or props.get("codezone")
-        or props.get("typezone")
-    )
-
-    zone_label = (
-        props.get("libelong")
-        or props.get("LIBELLE_LONG")
-        or props.get("LIBELLELONG")
-        or props.get("LIBELLE")
-        or props.get("libelle")
-        or props.get("LIB_ZONE")
-        or props.get("LIBELLE_ZONE")
-        or props.get("NOM_ZONE")
-        or props.get("nom_zone")
-    )
+    # Single case-insensitive view of the attributes, probed in priority order
+    ci = {k.lower(): v for k, v in props.items()}
+    zone_code = next((ci[k] for k in _ZONE_CODE_KEYS if ci.get(k)), None)
+    zone_label = next((ci[k] for k in _ZONE_LABEL_KEYS if ci.get(k)), None)
 
     # Fallback: if no zone_code, try any field containing "zone"
     if not zone_code:
-        for k, v in props.items():
-            if "zone" in k.lower() and isinstance(v, str) and len(v) <= 10:
-                zone_code = v
-                break
+        zone_code = next(
+            (
+                v
+                for k, v in ci.items()
+                if "zone" in k and isinstance(v, str) and len(v) <= 10
+            ),
+            None,
+        )
 
     return {
         "zone_code": zone_code,
@@ -469,6 +504,138 @@ def build_plu_pdf_url_from_properties(props: dict) -> str | None:
     return f"https://www.geoportail-urbanisme.gouv.fr/api/document/{doc_id}/download-file/{filename}"
 
 
+@st.cache_data(ttl=1800)
+def get_parcel_and_plu_from_wfs(lat, lon, bbox_deg=0.001, max_features=10):
+    """
+    Query IGN WFS for PLU zones and cadastral parcels around a point with a
+    single GetFeature request (two TYPENAMES, one round-trip).
+
+    Zone polygons are large, so any zone covering the point also intersects
+    the parcel-sized bbox. Zones are listed first so the parcels can't crowd
+    them out of COUNT.
+
+    Returns:
+        (plu_info, parcel), see plu_zone_from_features / parcel_from_features.
+    """
+    # The bbox is centred on a ~11 m grid so nearby lookups share a
+    # disk-cache entry; the closest-feature logic still uses lat/lon.
+    qlat, qlon = round(lat, 4), round(lon, 4)
+    min_lon = qlon - bbox_deg
+    min_lat = qlat - bbox_deg
+    max_lon = qlon + bbox_deg
+    max_lat = qlat + bbox_deg
+
+    params = {
+        "SERVICE": "WFS",
+        "VERSION": "2.0.0",
+        "REQUEST": "GetFeature",
+        "TYPENAMES": f"{WFS_PLU_LAYER},{WFS_PARCEL_LAYER}",
+        "SRSNAME": "EPSG:4326",
+        "BBOX": f"{min_lon},{min_lat},{max_lon},{max_lat},EPSG:4326",
+        "OUTPUTFORMAT": "application/json",
+        "COUNT": str(2 * max_features),
+        # One projection per typename, in the same order
+        "PROPERTYNAME": f"({WFS_PLU_PROPERTIES})({WFS_PARCEL_PROPERTIES})",
+    }
+
+    try:
+        data = disk_cached_get_json(
+            WFS_URL,
+            params,
+            key=("wfs", qlat, qlon, bbox_deg, max_features),
+            max_age=WFS_MAX_AGE,
+        )
+    except Exception as e:
+        print("IGN WFS error:", e)
+        return None, None
+
+    # Feature ids are "<layer>.<n>", e.g. "zone_urba.42" / "parcelle.1337"
+    by_layer = {}
+    for feat in data.get("features", []):
+        layer = str(feat.get("id", "")).split(".", 1)[0]
+        by_layer.setdefault(layer, []).append(feat)
+
+    plu_info = plu_zone_from_features(by_layer.get("zone_urba"))
+    parcel = parcel_from_features(by_layer.get("parcelle"), lat, lon)
+    return plu_info, parcel
+
+
+@st.cache_data(ttl=600)
+def fetch_location_data(lat, lon, token, radii, require_pano):
+    """
+    Run the WFS (PLU + cadastre) and Mapillary lookups concurrently.
+
+    The calls are independent network round-trips, so the wall time is
+    that of the slowest one instead of their sum. An empty token skips the
+    Mapillary lookup.
+
+    Returns:
+        (plu_info, parcel, (thumb_url, meta_dict))
+    """
+    # Workers need the script context to use the cached helpers above.
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=2, initializer=add_script_run_ctx, initargs=(None, ctx)
+    ) as ex:
+        f_wfs = ex.submit(get_parcel_and_plu_from_wfs, lat, lon)
+        f_map = (
+            ex.submit(
+                cached_mapillary_find_best, lat, lon, token, radii, require_pano
+            )
+            if token
+            else None
+        )
+        plu_info, parcel = f_wfs.result()
+        try:
+            mly = f_map.result() if f_map else (None, None)
+        except Exception as e:
+            # Never lose the WFS result over the prefetch: the Street View
+            # tab repeats the lookup and reports the error
+            print("Mapillary error:", e)
+            mly = (None, None)
+        return plu_info, parcel, mly
+
+
+@st.cache_data(ttl=1800, max_entries=64, show_spinner=False)
+def build_map_html(lat, lon, label, parcel_coords):
+    """
+    Render the Folium map (marker + parcel outline) to standalone HTML.
+
+    `parcel_coords` is a tuple of (lat, lon) tuples, or None when no parcel
+    was found, so the rendered page is reused until the location changes.
+    """
+    m = folium.Map(location=[lat, lon], zoom_start=18, control_scale=True)
+    folium.Marker([lat, lon], tooltip=label, popup=label).add_to(m)
+
+    if parcel_coords:
+        folium.Polygon(
+            locations=[list(pt) for pt in parcel_coords],
+            color="red",
+            weight=2,
+            fill=True,
+            fill_opacity=0.2,
+            tooltip="Parcel (IGN Parcellaire Express)",
+        ).add_to(m)
+    else:
+        offset = 0.0003
+        fake_polygon_coords = [
+            [lat - offset, lon - offset],
+            [lat - offset, lon + offset],
+            [lat + offset, lon + offset],
+            [lat + offset, lon - offset],
+        ]
+        folium.Polygon(
+            locations=fake_polygon_coords,
+            color="orange",
+            weight=2,
+            fill=True,
+            fill_opacity=0.1,
+            tooltip="Parcel (demo, no cadastre found)",
+        ).add_to(m)
+
+    return m.get_root().render()
+
+
 # ======================================
 # Session state
 # ======================================
@@ -489,32 +656,18 @@ st.markdown("---")
 
 with st.sidebar:
     st.markdown("## Settings")
-
-    provider = st.selectbox(
-        "Street imagery provider",
-        ["Auto", "Mapillary", "Google"],
-        help="Auto: try Mapillary first, then Google if needed.",
-    )
-
-    radius = st.slider(
-        "Mapillary search radius (meters)",
-        50,
-        1000,
-        150,
-        step=50,
-        help="Controls how far the app searches for nearby Mapillary images.",
-    )
-
-    pano_first = st.checkbox(
-        "Prefer panoramic Mapillary images", value=True
-    )
-
-    st.markdown("---")
     st.markdown("### API keys")
     st.caption(
         "API keys are configured server-side (not visible to the user)."
     )
 
+# Street imagery settings are widgets of the Street View fragment below; the
+# last values seen are used to prefetch Mapillary alongside the WFS lookup.
+provider = st.session_state.get("provider", "Auto")
+radius = st.session_state.get("mly_radius", 150)
+pano_first = st.session_state.get("pano_first", True)
+radii = mapillary_radii(radius)
+
 # ======================================
 # UI – Address + geocoding
 # ======================================
@@ -565,16 +718,29 @@ st.success(
 )
 
 # ======================================
-# PLU info & parcel
+# PLU info, parcel & street imagery
 # ======================================
 
-plu_info = get_plu_zone_from_wfs(lat, lon)
+# Mapillary is only queried when it may actually be displayed.
+mly_token = MAPILLARY_TOKEN if provider in ("Auto", "Mapillary") else ""
+
+# WFS data only depends on the location: other reruns reuse it from
+# session_state. Empty results (e.g. a WFS outage) aren't memoised there,
+# so they are retried once the st.cache_data entries expire. The Mapillary
+# result is only used to warm its cache for the Street View fragment.
+geo_key = (round(lat, 6), round(lon, 6))
+if st.session_state.get("_last_geo_key") != geo_key:
+    plu_info, parcel, _ = fetch_location_data(lat, lon, mly_token, radii, pano_first)
+    if plu_info or parcel:
+        st.session_state._plu = plu_info
+        st.session_state._parcel = parcel
+        st.session_state._last_geo_key = geo_key
+else:
+    plu_info = st.session_state._plu
+    parcel = st.session_state._parcel
 props = plu_info.get("raw_properties", {}) if plu_info else {}
 pdf_url = build_plu_pdf_url_from_properties(props) if plu_info else None
 
-# Cadastral parcel (coords + area)
-parcel = get_cadastre_parcel_from_wfs(lat, lon)
-
 # ======================================
 # Summary sheet
 # ======================================
@@ -622,36 +788,11 @@ tab_carte, tab_plu, tab_street, tab_brut = st.tabs(
 with tab_carte:
     st.subheader("Map & cadastral parcel")
 
-    m = folium.Map(location=[lat, lon], zoom_start=18, control_scale=True)
-    folium.Marker([lat, lon], tooltip=label, popup=label).add_to(m)
-
+    parcel_coords = None
     if parcel and parcel.get("coords"):
-        folium.Polygon(
-            locations=parcel["coords"],
-            color="red",
-            weight=2,
-            fill=True,
-            fill_opacity=0.2,
-            tooltip="Parcel (IGN Parcellaire Express)",
-        ).add_to(m)
-    else:
-        offset = 0.0003
-        fake_polygon_coords = [
-            [lat - offset, lon - offset],
-            [lat - offset, lon + offset],
-            [lat + offset, lon + offset],
-            [lat + offset, lon - offset],
-        ]
-        folium.Polygon(
-            locations=fake_polygon_coords,
-            color="orange",
-            weight=2,
-            fill=True,
-            fill_opacity=0.1,
-            tooltip="Parcel (demo, no cadastre found)",
-        ).add_to(m)
-
-    st_folium(m, height=450, use_container_width=True)
+        parcel_coords = tuple(map(tuple, parcel["coords"]))
+    map_html = build_map_html(lat, lon, label, parcel_coords)
+    st.components.v1.html(map_html, height=460, scrolling=False)
 
 # ---------------------- PLU / Zoning ---------------------- #
 # ---------------------- PLU / Zoning ---------------------- #
@@ -708,35 +849,71 @@ with tab_plu:
 
 
 # ---------------------- Street View / Panoramic ---------------------- #
-with tab_street:
-    st.subheader("Street-level view (Mapillary / Google)")
+@st.fragment
+def street_view_tab(lat, lon):
+    """
+    Street View tab body. As a fragment, changing its settings only reruns
+    this function, not the geocoding / WFS / map code above.
+    """
+    col_prov, col_rad, col_pano = st.columns([1, 2, 1])
+    with col_prov:
+        provider = st.selectbox(
+            "Street imagery provider",
+            ["Auto", "Mapillary", "Google"],
+            key="provider",
+            help="Auto: try Mapillary first, then Google if needed.",
+        )
+    with col_rad:
+        radius = st.slider(
+            "Mapillary search radius (meters)",
+            50,
+            1000,
+            150,
+            step=50,
+            key="mly_radius",
+            help="Controls how far the app searches for nearby Mapillary images.",
+        )
+    with col_pano:
+        pano_first = st.checkbox(
+            "Prefer panoramic Mapillary images", value=True, key="pano_first"
+        )
+
+    radii = mapillary_radii(radius)
+    mly_error = None
+
+    def find_mapillary(require_pano):
+        """
+        Cached Mapillary lookup. A hard API error (e.g. an expired token) is
+        shown once and treated as "no image", so Auto can fall back to Google.
+        """
+        nonlocal mly_error
+        if mly_error:
+            return None, None
+        try:
+            return cached_mapillary_find_best(
+                lat, lon, MAPILLARY_TOKEN, radii, require_pano
+            )
+        except (requests.exceptions.RequestException, ValueError) as e:
+            mly_error = e
+            st.warning(f"Mapillary request failed: {e}")
+            return None, None
+
+    mly_thumb, mly_meta = None, None
+    if MAPILLARY_TOKEN and provider in ("Auto", "Mapillary"):
+        # Usually a cache hit: prefetched by fetch_location_data()
+        mly_thumb, mly_meta = find_mapillary(pano_first)
 
     chosen_provider = provider
     selected_thumb = None
     selected_meta = None
 
-    # Radius list for Mapillary (based on the slider)
-    radii = (
-        radius,
-        max(radius * 2, 300),
-        600,
-        1200,
-        3000,
-        6000,
-        10000,
-    )
-
     # Auto mode: Mapillary first, then Google
     if provider == "Auto":
         if MAPILLARY_TOKEN:
-            thumb, meta = mapillary_find_best(
-                lat, lon, MAPILLARY_TOKEN, radii_m=radii, require_pano=pano_first
-            )
+            thumb, meta = mly_thumb, mly_meta
             # If pano requested but not found, try again without pano constraint
             if pano_first and (not thumb or not isinstance(meta, dict)):
-                thumb, meta = mapillary_find_best(
-                    lat, lon, MAPILLARY_TOKEN, radii_m=radii, require_pano=False
-                )
+                thumb, meta = find_mapillary(False)
 
             if thumb and isinstance(meta, dict):
                 chosen_provider = "Mapillary"
@@ -754,20 +931,16 @@ with tab_street:
             )
         else:
             if not selected_thumb or not selected_meta:
-                thumb, meta = mapillary_find_best(
-                    lat, lon, MAPILLARY_TOKEN, radii_m=radii, require_pano=pano_first
-                )
-                if pano_first and (not thumb or not isinstance(meta, dict)):
+                thumb, meta = mly_thumb, mly_meta
+                if (
+                    pano_first
+                    and not mly_error
+                    and (not thumb or not isinstance(meta, dict))
+                ):
                     st.info(
                         "No panoramic image found nearby — searching for the closest available image."
                     )
-                    thumb, meta = mapillary_find_best(
-                        lat,
-                        lon,
-                        MAPILLARY_TOKEN,
-                        radii_m=radii,
-                        require_pano=False,
-                    )
+                    thumb, meta = find_mapillary(False)
             else:
                 thumb, meta = selected_thumb, selected_meta
 
@@ -776,37 +949,26 @@ with tab_street:
             else:
                 static_url = meta.get("thumb_1024_url") or thumb
 
-                # Static preview
-                try:
-                    img_resp = requests.get(static_url, timeout=20)
-                    img_resp.raise_for_status()
-                    st.image(
-                        img_resp.content,
-                        caption="Mapillary static preview",
-                        use_column_width=True,
-                    )
-                except Exception as e:
-                    st.warning(f"Error loading static image: {e}")
-
                 is_pano = bool(meta.get("is_pano"))
-                date_str = _fmt_date(meta.get("captured_at", ""))
+                date_str = fmt_date(meta.get("captured_at", ""))
 
-                if is_pano:
-                    st.markdown("##### Mapillary panoramic view (Pannellum)")
-                    pano_url = meta.get("thumb_2048_url") or static_url
+                # Static preview (panoramas are shown by the viewer below, so
+                # their flat preview would be a redundant download)
+                if not is_pano:
                     try:
-                        pbytes = requests.get(pano_url, timeout=30)
-                        pbytes.raise_for_status()
-                        html_block = pannellum_html_from_image_bytes(
-                            pbytes.content, height_px=480
-                        )
-                        st.components.v1.html(
-                            html_block, height=520, scrolling=False
+                        st.image(
+                            fetch_bytes(static_url),
+                            caption="Mapillary static preview",
+                            use_column_width=True,
                         )
                     except Exception as e:
-                        st.warning(
-                            f"Error loading panorama (showing static image only): {e}"
-                        )
+                        st.warning(f"Error loading static image: {e}")
+
+                if is_pano:
+                    st.markdown("##### Mapillary panoramic view (Pannellum)")
+                    pano_url = meta.get("thumb_2048_url") or static_url
+                    html_block = pannellum_html_from_url(pano_url, height_px=480)
+                    st.components.v1.html(html_block, height=520, scrolling=False)
                 else:
                     st.info(
                         "This image is not panoramic (standard street-level photo)."
@@ -838,6 +1000,11 @@ with tab_street:
             "No street imagery provider is available, or no image was found near this location."
         )
 
+
+with tab_street:
+    st.subheader("Street-level view (Mapillary / Google)")
+    street_view_tab(lat, lon)
+
 # ---------------------- Raw data ---------------------- #
 with tab_brut:
     st.subheader("Raw data / debug")
@@ -1,22 +1,121 @@
 import os
+import re
+import hashlib
 import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+import diskcache
+import numpy as np
+import orjson
 import requests
 from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 MAPILLARY_API = "https://graph.mapillary.com"
 
+# Transient HTTP statuses worth retrying / falling back on
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Shared HTTP session: keep-alive connections to the same few hosts
+# (Mapillary, IGN, Nominatim) are reused across calls and threads.
+SESSION = requests.Session()
+SESSION.headers.update(
+    {
+        "User-Agent": "MapExplorer/1.0 (educational-demo)",
+        # gzip/deflate, plus br/zstd when a decoder is installed: advertising
+        # an encoding urllib3 can't decode would break the response
+        "Accept-Encoding": requests.utils.DEFAULT_ACCEPT_ENCODING,
+    }
+)
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        # Only transient statuses are retried: retrying connect/read timeouts
+        # would multiply every caller's timeout by the number of attempts.
+        max_retries=Retry(
+            total=3,
+            connect=0,
+            read=0,
+            backoff_factor=0.3,
+            status_forcelist=RETRY_STATUSES,
+        ),
+    ),
+)
+# Nominatim allows 1 req/s: nominatim_geocode() paces its own retries, so
+# the session must not add fast ones on top (longest prefix mount wins).
+SESSION.mount(
+    "https://nominatim.openstreetmap.org",
+    HTTPAdapter(max_retries=0),
+)
+
+# Same headers, no retries at all: for calls whose timeout must be a hard cap
+SESSION_NO_RETRY = requests.Session()
+SESSION_NO_RETRY.headers.update(SESSION.headers)
+SESSION_NO_RETRY.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0),
+)
+
+# Headers for the JSON APIs (image downloads keep the session defaults)
+JSON_HEADERS = {"Accept": "application/json"}
+
+# Persistent cache for slow-changing data (WFS parcels / PLU zones).
+# Unlike st.cache_data it survives restarts and is shared by all sessions.
+DISK_CACHE = diskcache.Cache(str(Path(__file__).parent / ".wfs_cache"))
+
+
+def disk_cached_get_json(url: str, params: dict, key, max_age: float):
+    """
+    GET a JSON document through the on-disk cache.
+
+    Entries younger than `max_age` seconds are returned without touching the
+    network. Older ones are revalidated with If-None-Match when the server sent
+    an ETag, so an unchanged document costs a 304 instead of a full download.
+    Raises on HTTP/network errors, like `requests` would.
+
+    `key` is completed with a digest of the URL and parameters, so changing
+    the request shape (layers, projected fields, ...) never serves entries
+    stored for the old one.
+    """
+    query = orjson.dumps({"url": url, "params": params}, option=orjson.OPT_SORT_KEYS)
+    key = (key, hashlib.blake2b(query, digest_size=16).hexdigest())
+    entry = DISK_CACHE.get(key)
+    if entry and time.time() - entry["fetched_at"] < max_age:
+        return entry["data"]
+
+    headers = dict(JSON_HEADERS)
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+
+    r = SESSION.get(url, params=params, headers=headers, timeout=20)
+    if r.status_code == 304 and entry:
+        data = entry["data"]
+    else:
+        r.raise_for_status()
+        data = orjson.loads(r.content)
+
+    if "no-store" not in r.headers.get("Cache-Control", ""):
+        DISK_CACHE.set(
+            key,
+            {"data": data, "etag": r.headers.get("ETag"), "fetched_at": time.time()},
+        )
+    return data
+
 def nominatim_geocode(address: str, retries: int = 3, delay: float = 1.0):
     """Return (lat, lon, label) or (None, None, None) if not found."""
     if not address:
         return None, None, None
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": address, "format": "json", "limit": 1}
-    headers = {"User-Agent": "MapExplorer/1.0 (educational-demo)"}
     for attempt in range(retries):
         try:
-            r = requests.get(url, params=params, headers=headers, timeout=20)
+            r = SESSION.get(url, params=params, headers=JSON_HEADERS, timeout=20)
             r.raise_for_status()
-            data = r.json()
+            data = orjson.loads(r.content)
             if data:
                 lat, lon = float(data[0]["lat"]), float(data[0]["lon"])
                 label = data[0].get("display_name", address)
@@ -32,7 +131,7 @@ def mapillary_nearest_image(lat: float, lon: float, token: str, radius_m: int =
     Robust image lookup with debug info.
     Returns dict {id, thumb_url, lat, lon, captured_at, debug} or None.
     """
-    import math, requests
+    import math
 
     def _extract_first(data):
         if data.get("data"):
@@ -62,8 +161,8 @@ def mapillary_nearest_image(lat: float, lon: float, token: str, radius_m: int =
             "closeto": f"{lon},{lat}",
             "limit": 1,
         }
-        r = requests.get(API, params=params, timeout=15)
-        j = r.json()
+        r = SESSION.get(API, params=params, headers=JSON_HEADERS, timeout=15)
+        j = orjson.loads(r.content)
         hit = _extract_first(j)
         if hit:
             hit["debug"] = f"closeto OK (HTTP {r.status_code})"
@@ -83,8 +182,8 @@ def mapillary_nearest_image(lat: float, lon: float, token: str, radius_m: int =
             "bbox": bbox,
             "limit": 1,
         }
-        r = requests.get(API, params=params, timeout=15)
-        j = r.json()
+        r = SESSION.get(API, params=params, headers=JSON_HEADERS, timeout=15)
+        j = orjson.loads(r.content)
         hit = _extract_first(j)
         if hit:
             hit["debug"] = f"bbox OK (HTTP {r.status_code})"
@@ -104,8 +203,8 @@ def mapillary_nearest_image(lat: float, lon: float, token: str, radius_m: int =
             "bbox": bbox,
             "limit": 1,
         }
-        r = requests.get(API, params=params, timeout=15)
-        j = r.json()
+        r = SESSION.get(API, params=params, headers=JSON_HEADERS, timeout=15)
+        j = orjson.loads(r.content)
         hit = _extract_first(j)
         if hit:
             hit["debug"] = f"bbox x2 OK (HTTP {r.status_code})"
@@ -121,6 +220,49 @@ def mapillary_nearest_image(lat: float, lon: float, token: str, radius_m: int =
         "bbox_x2": third_try_note,
     }
 
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+def _date_from_epoch(value) -> str:
+    try:
+        # If > 1e12 it is likely in milliseconds
+        if value > 1e12:
+            value /= 1000.0
+        tm = time.gmtime(value)
+        return f"{tm.tm_year:04d}-{tm.tm_mon:02d}-{tm.tm_mday:02d}"
+    except Exception:
+        return ""
+
+def _date_from_iso(value: str) -> str:
+    # Mapillary ISO strings start with the date: no need to parse them
+    if _DATE_RE.match(value):
+        return value[:10]
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).date().isoformat()
+    except Exception:
+        return value[:10]
+
+_FMT_DISPATCH = {int: _date_from_epoch, float: _date_from_epoch, str: _date_from_iso}
+
+@lru_cache(maxsize=256)
+def fmt_date(value) -> str:
+    """Convert Mapillary date or timestamp to an ISO date string when possible."""
+    if not value:
+        return ""
+    return _FMT_DISPATCH.get(type(value), str)(value)
+
+def haversine_vector(lat1: float, lon1: float, lats, lons):
+    """
+    Haversine distances in meters from (lat1, lon1) to arrays of points.
+    Returns an ndarray shaped like `lats`/`lons`.
+    """
+    lat1, lon1 = np.radians(lat1), np.radians(lon1)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lats - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lats) * np.sin((lons - lon1) / 2) ** 2
+    )
+    return 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+
 def google_streetview_embed_url(lat: float, lon: float, api_key: str, fov: int = 80):
     """
     Returns an embeddable Google Street View iframe URL (Embed API v1).